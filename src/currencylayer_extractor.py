@@ -62,7 +62,7 @@ def currencylayer_source(date: Optional[str] = None):
             # CRITICAL: Detect quota exhaustion BEFORE raising
             if response.status_code == 429:
                 logger.error("CurrencyLayer returned 429 (rate limited)")
-                quota_mgr = QuotaManager(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
+                quota_mgr = QuotaManager.get(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
                 failover_api = quota_mgr.mark_api_throttled(api_source="currencylayer")
 
                 if failover_api:
@@ -81,7 +81,7 @@ def currencylayer_source(date: Optional[str] = None):
                 # Error code 104: Monthly request volume reached
                 if error_code == 104:
                     logger.error(f"CurrencyLayer quota exhausted (error code 104)")
-                    quota_mgr = QuotaManager(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
+                    quota_mgr = QuotaManager.get(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
                     quota_mgr.mark_api_throttled(api_source="currencylayer")
                     raise RuntimeError("CurrencyLayer quota exhausted (error code 104), marked as throttled")
 
@@ -150,7 +150,7 @@ def currencylayer_range_source(start_date: str, end_date: str):
             # CRITICAL: Detect quota exhaustion BEFORE raising
             if response.status_code == 429:
                 logger.error("CurrencyLayer returned 429 (rate limited)")
-                quota_mgr = QuotaManager(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
+                quota_mgr = QuotaManager.get(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
                 quota_mgr.mark_api_throttled(api_source="currencylayer")
                 raise RuntimeError("CurrencyLayer quota exhausted (HTTP 429), marked as throttled")
 
@@ -165,7 +165,7 @@ def currencylayer_range_source(start_date: str, end_date: str):
                 # Error code 104: Monthly request volume reached
                 if error_code == 104:
                     logger.error(f"CurrencyLayer quota exhausted (error code 104)")
-                    quota_mgr = QuotaManager(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
+                    quota_mgr = QuotaManager.get(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
                     quota_mgr.mark_api_throttled(api_source="currencylayer")
                     raise RuntimeError("CurrencyLayer quota exhausted (error code 104), marked as throttled")
 
@@ -201,7 +201,7 @@ def currencylayer_range_source(start_date: str, end_date: str):
 def run_currencylayer_pipeline(date: str = None):
     # Quota management boilerplate
     dynamodb_endpoint = os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000")
-    quota_manager = QuotaManager(endpoint_url=dynamodb_endpoint)
+    quota_manager = QuotaManager.get(endpoint_url=dynamodb_endpoint)
     
     try:
         pipeline = dlt.pipeline(pipeline_name="currencylayer_to_bronze", destination="filesystem", dataset_name="currencylayer")
@@ -215,7 +215,7 @@ def run_currencylayer_pipeline(date: str = None):
 def run_currencylayer_backfill(start_date: str, end_date: str):
     logger.info(f"🚀 Starting CurrencyLayer Backfill: {start_date} to {end_date}")
     dynamodb_endpoint = os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000")
-    quota_manager = QuotaManager(endpoint_url=dynamodb_endpoint)
+    quota_manager = QuotaManager.get(endpoint_url=dynamodb_endpoint)
 
     try:
         pipeline = dlt.pipeline(pipeline_name="currencylayer_backfill", destination="filesystem", dataset_name="currencylayer")
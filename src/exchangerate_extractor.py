@@ -74,7 +74,7 @@ def exchangerate_source(api_key: str = None, use_v6: bool = False):
             # CRITICAL: Detect quota exhaustion BEFORE raising
             if response.status_code == 429:
                 logger.error("ExchangeRate-API returned 429 (rate limited)")
-                quota_mgr = QuotaManager(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
+                quota_mgr = QuotaManager.get(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
                 failover_api = quota_mgr.mark_api_throttled(api_source="exchangerate")
 
                 if failover_api:
@@ -128,7 +128,7 @@ def run_exchangerate_pipeline(api_key: str = None, use_v6: bool = False):
 
     # Initialize quota manager for tracking API usage
     dynamodb_endpoint = os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000")
-    quota_manager = QuotaManager(endpoint_url=dynamodb_endpoint)
+    quota_manager = QuotaManager.get(endpoint_url=dynamodb_endpoint)
 
     try:
         # Create pipeline pointing to MinIO (configured in .dlt/secrets.toml)
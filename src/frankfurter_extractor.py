@@ -56,7 +56,7 @@ def frankfurter_source():
             if response.status_code == 429:
                 logger.error("Frankfurter returned 429 (rate limited)")
                 # Mark as throttled, get failover API
-                quota_mgr = QuotaManager(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
+                quota_mgr = QuotaManager.get(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
                 failover_api = quota_mgr.mark_api_throttled(api_source="frankfurter")
 
                 if failover_api:
@@ -124,7 +124,7 @@ def frankfurter_range_source(start_date: str, end_date: str):
             # CRITICAL: Detect quota exhaustion BEFORE raising
             if response.status_code == 429:
                 logger.error("Frankfurter returned 429 (rate limited)")
-                quota_mgr = QuotaManager(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
+                quota_mgr = QuotaManager.get(endpoint_url=os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000"))
                 failover_api = quota_mgr.mark_api_throttled(api_source="frankfurter")
 
                 if failover_api:
@@ -177,7 +177,7 @@ def run_frankfurter_pipeline():
 
     # Initialize quota manager for tracking API usage
     dynamodb_endpoint = os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000")
-    quota_manager = QuotaManager(endpoint_url=dynamodb_endpoint)
+    quota_manager = QuotaManager.get(endpoint_url=dynamodb_endpoint)
 
     try:
         # Create pipeline pointing to MinIO (configured in .dlt/secrets.toml)
@@ -218,7 +218,7 @@ def run_frankfurter_backfill(start_date: str, end_date: str):
     logger.info(f"🚀 Starting Frankfurter Backfill: {start_date} to {end_date}")
     
     dynamodb_endpoint = os.getenv("DYNAMODB_ENDPOINT", "http://localhost:8000")
-    quota_manager = QuotaManager(endpoint_url=dynamodb_endpoint)
+    quota_manager = QuotaManager.get(endpoint_url=dynamodb_endpoint)
 
     try:
         pipeline = dlt.pipeline(
@@ -3,11 +3,11 @@ import sys
 import argparse
 import logging
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple
 import pyarrow as pa
 from duckdb import DuckDBPyConnection, connect
 from pyiceberg.catalog import load_catalog
-from utils.s3_helper import get_s3_client, check_s3_prefix_exists
+from utils.s3_helper import get_s3_client, check_s3_prefixes_exist
 from utils.helpers import load_config
 from utils.logging_config import root_logger as logger
 from utils.timezone_helper import get_utc_now
@@ -15,6 +15,19 @@ from utils.timezone_helper import get_utc_now
 # Configure Logging (Already done in root_logger)
 from utils.dynamodb import DynamoDBClient
 
+# Bronze fields carried into Silver (besides the flattened rates__* columns)
+BRONZE_COLUMNS = [
+    "extraction_id",
+    "extraction_timestamp",
+    "source",
+    "source_tier",
+    "base_currency",
+    "rate_date",
+    "http_status_code",
+    "filename"
+]
+BRONZE_COLUMNS_SQL = ", ".join(f"'{col}'" for col in BRONZE_COLUMNS)
+
 class IcebergLoader:
     """
     Handles Loading of Bronze JSONL data into Silver Iceberg tables.
@@ -43,6 +56,13 @@ class IcebergLoader:
         # 5. DynamoDB Table Names from settings
         self.dynamodb_tables = self.settings.get("dynamodb_tables", {})
 
+        # 6. Last schema seen by the Iceberg table (skips the evolution diff on repeat loads)
+        self._last_schema_hash = None
+
+        # 7. Iceberg catalog handle and namespace state (resolved lazily, reused across loads)
+        self._catalog = None
+        self._namespace_ready = False
+
     def _load_environment_variables(self) -> Dict[str, str]:
         """Loads and validates environment variables based on settings.yaml."""
         config: Dict[str, str] = {}
@@ -69,27 +89,34 @@ class IcebergLoader:
 
     def _setup_duckdb(self) -> DuckDBPyConnection:
         """Configures DuckDB with S3/MinIO settings."""
-        con = connect()
-        con.sql("INSTALL httpfs; LOAD httpfs;")
-        
-        endpoint = self.env_config.get("AWS_ENDPOINT_URL")
-        access_key = self.env_config.get("AWS_ACCESS_KEY_ID")
-        secret_key = self.env_config.get("AWS_SECRET_ACCESS_KEY")
-        region = self.env_config.get("AWS_REGION")
+        env = self.env_config
+        endpoint = env.get("AWS_ENDPOINT_URL")
+        access_key = env.get("AWS_ACCESS_KEY_ID")
+        secret_key = env.get("AWS_SECRET_ACCESS_KEY")
+        region = env.get("AWS_REGION")
 
+        s3_config: Dict[str, str] = {}
         if endpoint:
             # Clean endpoint for httpfs compatibility if needed
-            clean_endpoint = endpoint.replace('http://', '').replace('https://', '')
-            con.sql(f"SET s3_endpoint='{clean_endpoint}';")
-            con.sql("SET s3_use_ssl=false;")
-            con.sql("SET s3_url_style='path';")
+            s3_config["s3_endpoint"] = endpoint.replace('http://', '').replace('https://', '')
+            s3_config["s3_use_ssl"] = "false"
+            s3_config["s3_url_style"] = "path"
         
         if access_key and secret_key:
-            con.sql(f"SET s3_access_key_id='{access_key}';")
-            con.sql(f"SET s3_secret_access_key='{secret_key}';")
+            s3_config["s3_access_key_id"] = access_key
+            s3_config["s3_secret_access_key"] = secret_key
         
         if region:
-            con.sql(f"SET s3_region='{region}';")
+            s3_config["s3_region"] = region
+
+        # httpfs must be loaded before any s3_* setting exists; then apply all settings
+        # in one batched SET statement (single parse/exec round-trip)
+        con = connect()
+        con.sql("INSTALL httpfs; LOAD httpfs;")
+        if s3_config:
+            # Escape embedded quotes in values (e.g. secrets) for the SQL string literals
+            escaped = {key: value.replace("'", "''") for key, value in s3_config.items()}
+            con.sql(" ".join(f"SET {key}='{value}';" for key, value in escaped.items()))
 
         return con
 
@@ -155,10 +182,13 @@ class IcebergLoader:
 
         logger.info(f"Resolving Source Pattern for mode={self.mode}...")
         
+        # S3 Helper expects full path (s3://...) and handles stripping internally now.
+        # All candidates are probed concurrently; the first hit in priority order wins.
+        logger.info(f"Checking prefixes: {[check_prefix for check_prefix, _ in candidates]}")
+        found = check_s3_prefixes_exist(self.s3_client, source_bucket, (c for c, _ in candidates))
+
         for check_prefix, glob_pattern in candidates:
-            # S3 Helper expects full path (s3://...) and handles stripping internally now.
-            logger.info(f"Checking prefix: {check_prefix}")
-            if check_s3_prefix_exists(self.s3_client, source_bucket, check_prefix):
+            if found[check_prefix]:
                 logger.info(f"✅ Found data at: {check_prefix}. Using pattern: {glob_pattern}")
                 return glob_pattern
                 
@@ -171,11 +201,13 @@ class IcebergLoader:
         """
         logger.info(f"Scanning source pattern: {source_pattern}")
 
-        # Step 1: Read with auto schema detection to get all flattened columns
+        # Step 1: Read with auto schema detection, projecting only the columns we use
         # CRITICAL: union_by_name=true prevents type-versioned columns (__v_double suffix)
+        # The COLUMNS() lambda is pushed into the JSON scan, so api_response_raw__* and other
+        # provider noise are skipped at parse time instead of being buffered into the temp table.
         query = f"""
         CREATE OR REPLACE TEMP TABLE bronze_flattened AS
-        SELECT *
+        SELECT COLUMNS(c -> c IN ({BRONZE_COLUMNS_SQL}) OR c LIKE 'rates__%')
         FROM read_json_auto('{source_pattern}',
             format='newline_delimited',
             filename=true,
@@ -192,11 +224,13 @@ class IcebergLoader:
             raise e
 
         # Step 2: Reconstruct the rates MAP from flattened rates__* columns
-        # Get list of all rates__* columns dynamically
+        # Get list of all rates__* columns dynamically (catalog metadata only, no projection binding)
         rates_cols_query = """
         SELECT column_name
-        FROM (DESCRIBE SELECT * FROM bronze_flattened)
-        WHERE column_name LIKE 'rates__%'
+        FROM information_schema.columns
+        WHERE table_name = 'bronze_flattened'
+          AND column_name LIKE 'rates__%'
+        ORDER BY ordinal_position
         """
         rates_cols = [row[0] for row in self.con.sql(rates_cols_query).fetchall()]
 
@@ -237,61 +271,60 @@ class IcebergLoader:
             except Exception as e:
                 logger.warning(f"Data quality NULL check failed (non-critical): {e}")
 
-        if rates_cols:
-            # Build MAP using map_from_entries with FILTER to exclude NULLs
-            # Create list of struct entries: {key: 'USD', value: rates__usd}
-            # Filter out NULL values to avoid Arrow errors
-            currency_keys_raw = [col.replace('rates__', '').upper() for col in rates_cols]
-
-            # Filter out empty or invalid keys (defensive check)
-            valid_pairs = [(col, key) for col, key in zip(rates_cols, currency_keys_raw) if key and len(key) > 0]
-
-            if not valid_pairs:
-                # No valid currency columns found
-                rates_map_expr = "MAP([], [])::MAP(VARCHAR, DOUBLE) AS rates"
-                logger.warning("No valid rates__* columns found after filtering, creating empty rates MAP")
-            else:
-                logger.info(f"Reconstructing MAP from {len(valid_pairs)} valid flattened rate columns (filtering NULLs and empty keys)")
-                currency_keys_list = [key for _, key in valid_pairs]
-                logger.info(f"Currency keys: {currency_keys_list}")
-
-                # Build CASE expressions to create structs only for non-NULL values
-                struct_list = ", ".join([
-                    f"CASE WHEN {col} IS NOT NULL THEN "
-                    f"{{key: '{key}', value: CAST({col} AS DOUBLE)}} "
-                    f"END"
-                    for col, key in valid_pairs
-                ])
-
-                # Use list_filter to remove NULL struct entries AND validate keys are not NULL/empty
-                # COALESCE with empty MAP to handle edge cases on subsequent runs
-                # This prevents Arrow validation errors from NULL keys
-                rates_map_expr = f"COALESCE(map_from_entries(list_filter([{struct_list}], x -> x IS NOT NULL AND x.key IS NOT NULL AND x.key != '')), MAP([], [])::MAP(VARCHAR, DOUBLE)) AS rates"
-                logger.debug(f"MAP expression (first 200 chars): {rates_map_expr[:200]}...")
+        empty_map_expr = "MAP([], [])::MAP(VARCHAR, DOUBLE)"
+
+        # Filter out empty or invalid keys (defensive check)
+        valid_cols = [col for col in rates_cols if col.replace('rates__', '')]
+
+        if valid_cols:
+            # Build MAP with a single UNPIVOT into (row, currency, rate) instead of one CASE per currency.
+            # UNPIVOT drops NULL rates natively; map_from_entries(list(...)) folds them back per row.
+            # ORDER BY col_name keeps MAP entry order deterministic, so rewrites of the same bronze data are identical.
+            logger.info(f"Reconstructing MAP from {len(valid_cols)} valid flattened rate columns (filtering NULLs and empty keys)")
+            logger.info(f"Currency keys: {[col.replace('rates__', '').upper() for col in valid_cols]}")
+
+            rates_select = ", ".join(f'CAST("{col}" AS DOUBLE) AS "{col}"' for col in valid_cols)
+            rates_in = ", ".join(f'"{col}"' for col in valid_cols)
+
+            self.con.sql(f"""
+            CREATE OR REPLACE TEMP TABLE bronze_rates_map AS
+            SELECT
+                row_id,
+                map_from_entries(list(struct_pack(key := UPPER(REPLACE(col_name, 'rates__', '')), value := rate) ORDER BY col_name)) AS rates
+            FROM (
+                SELECT rowid AS row_id, {rates_select} FROM bronze_flattened
+            ) UNPIVOT (rate FOR col_name IN ({rates_in}))
+            GROUP BY row_id;
+            """)
+
+            # LEFT JOIN keeps rows whose rates were all NULL (COALESCE gives them an empty MAP)
+            rates_map_expr = f"COALESCE(m.rates, {empty_map_expr}) AS rates"
+            from_clause = "bronze_flattened f LEFT JOIN bronze_rates_map m ON m.row_id = f.rowid"
         else:
             # Fallback: empty MAP if no rates columns found
-            rates_map_expr = "MAP([], [])::MAP(VARCHAR, DOUBLE) AS rates"
+            rates_map_expr = f"{empty_map_expr} AS rates"
+            from_clause = "bronze_flattened f"
             logger.warning("No rates__* columns found, creating empty rates MAP")
 
 
         # Create bronze_raw table with reconstructed MAP
         columns = [
-            "extraction_id",
-            "extraction_timestamp",
-            "source",
-            "source_tier",
-            "base_currency",
-            "rate_date",
+            "f.extraction_id",
+            "f.extraction_timestamp",
+            "f.source",
+            "f.source_tier",
+            "f.base_currency",
+            "f.rate_date",
             rates_map_expr,
-            "http_status_code",
-            "filename"
+            "f.http_status_code",
+            "f.filename"
         ]
 
         reconstruct_query = f"""
         CREATE OR REPLACE TEMP TABLE bronze_raw AS
         SELECT
             {', '.join(columns)}
-        FROM bronze_flattened;
+        FROM {from_clause};
         """
         self.con.sql(reconstruct_query)
         logger.info("✅ Successfully reconstructed rates MAP from flattened schema")
@@ -302,17 +335,19 @@ class IcebergLoader:
         
         # For daily mode: Accept latest data (3-day lookback for weekends/holidays)
         # For backfill mode: Use strict date range
+        # Dates are bound as parameters (not interpolated) so DuckDB can reuse the prepared plan
         if self.mode == "daily":
             # Daily: Accept data from past 3 days (handles weekends/holidays when APIs return latest available)
-            filter_clause = f"""
-                WHERE CAST(rate_date AS DATE) >= CAST('{self.start_date}' AS DATE) - INTERVAL '3 days'
+            filter_clause = """
+                WHERE CAST(rate_date AS DATE) >= CAST(? AS DATE) - INTERVAL '3 days'
             """
+            filter_params = [self.start_date]
         else:
             # Backfill: strict date range
-            filter_clause = f"""
-                WHERE CAST(rate_date AS DATE) >= CAST('{self.start_date}' AS DATE)
-                  AND CAST(rate_date AS DATE) <= CAST('{self.end_date}' AS DATE)
+            filter_clause = """
+                WHERE CAST(rate_date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
             """
+            filter_params = [self.start_date, self.end_date]
         
         final_query = f"""
         SELECT * EXCLUDE (filename, rn)
@@ -340,7 +375,7 @@ class IcebergLoader:
         )
         """
         try:
-            invalid_result = self.con.sql(validation_query).fetchone()
+            invalid_result = self.con.execute(validation_query, filter_params).fetchone()
             if invalid_result and invalid_result[0] > 0:
                 logger.error(f"❌ CRITICAL: Found {invalid_result[0]} rows with NULL or empty MAP keys!")
                 logger.error("This will cause Arrow validation errors. Filtering out invalid rows...")
@@ -357,7 +392,7 @@ class IcebergLoader:
             logger.warning(f"MAP validation query failed (might be empty result): {e}")
 
         try:
-            arrow_result = self.con.sql(final_query).arrow()
+            arrow_result = self.con.execute(final_query, filter_params).arrow()
 
             if isinstance(arrow_result, pa.RecordBatchReader):
                 arrow_table = arrow_result.read_all()
@@ -392,6 +427,25 @@ class IcebergLoader:
             logger.error(f"Final query (first 500 chars): {final_query[:500]}")
             raise
 
+    def _build_delete_predicates(self, arrow_table: pa.Table) -> Tuple[List[Tuple], List[str]]:
+        """
+        Collect the distinct primary-key tuples of the batch and one predicate per tuple.
+        Distinct keys are computed by Arrow's C++ group_by, so only the (usually much smaller)
+        distinct set is converted to Python, one to_pylist() per column.
+        """
+        distinct = arrow_table.select(self.pk_list).group_by(self.pk_list).aggregate([])
+        pk_columns = [distinct.column(pk).to_pylist() for pk in self.pk_list]
+        pk_values_set = list(zip(*pk_columns))
+
+        # Convert all values to strings and quote them (handles dates, strings, etc.)
+        # Dates come in as datetime.date objects and need to be converted to string
+        templates = [f"{pk} = '{{}}'" for pk in self.pk_list]
+        delete_predicates = [
+            "(" + " AND ".join(template.format(value) for template, value in zip(templates, pk_values)) + ")"
+            for pk_values in pk_values_set
+        ]
+        return pk_values_set, delete_predicates
+
     def load_to_iceberg(self, arrow_table: pa.Table):
         """
         UPSERTS the Arrow table into the Iceberg Catalog:
@@ -409,33 +463,47 @@ class IcebergLoader:
         table_name = self.env_config["TABLE_NAME"]
         
         try:
-            catalog = load_catalog(catalog_name)
+            # Catalog config parsing + auth setup happens once per loader
+            if self._catalog is None:
+                self._catalog = load_catalog(catalog_name)
+            catalog = self._catalog
             full_table_name = f"{namespace}.{table_name}"
             logger.info(f"Loading table: {full_table_name}")
             
-            # Ensure Namespace Exists
-            try:
-                catalog.create_namespace(namespace)
-                logger.info(f"Created/Verified namespace: {namespace}")
-            except Exception:
-                pass 
+            # Ensure Namespace Exists (only the first time; skips a round-trip on later loads)
+            if not self._namespace_ready:
+                try:
+                    catalog.create_namespace(namespace)
+                    logger.info(f"Created/Verified namespace: {namespace}")
+                except Exception:
+                    pass
+                self._namespace_ready = True
 
             try:
                 table = catalog.load_table(full_table_name)
                 logger.info(f"Table {full_table_name} exists. Checking for schema evolution...")
 
                 # Schema Evolution: Add new columns if present in arrow_table
-                existing_fields = {field.name for field in table.schema().fields}
-                incoming_fields = set(arrow_table.schema.names)
-                new_fields = incoming_fields - existing_fields
-
-                if new_fields:
-                    logger.info(f"Schema evolution: Adding {len(new_fields)} new columns: {sorted(new_fields)}")
-                    with table.update_schema() as update:
-                        update.union_by_name(arrow_table.schema)
-                    logger.info("✅ Schema evolved successfully")
+                # Cheap fingerprint of names + types: an unchanged schema skips the set diff entirely
+                schema_hash = hash((
+                    tuple(arrow_table.schema.names),
+                    tuple(str(field.type) for field in arrow_table.schema)
+                ))
+
+                if schema_hash == self._last_schema_hash:
+                    logger.info("No schema evolution needed (schema unchanged since last load)")
                 else:
-                    logger.info("No schema evolution needed")
+                    existing_fields = {field.name for field in table.schema().fields}
+                    new_fields = set(arrow_table.schema.names) - existing_fields
+
+                    if new_fields:
+                        logger.info(f"Schema evolution: Adding {len(new_fields)} new columns: {sorted(new_fields)}")
+                        with table.update_schema() as update:
+                            update.union_by_name(arrow_table.schema)
+                        logger.info("✅ Schema evolved successfully")
+                    else:
+                        logger.info("No schema evolution needed")
+                    self._last_schema_hash = schema_hash
 
             except Exception as e:
                 logger.info(f"Table {full_table_name} not found. Creating...")
@@ -479,22 +547,8 @@ class IcebergLoader:
             logger.info(f"Processing {arrow_table.num_rows} rows using delete+append (idempotent, MAP-safe)...")
 
             try:
-                # Extract unique combinations of primary key values
-                pk_values_set = set()
-                for i in range(arrow_table.num_rows):
-                    pk_tuple = tuple(arrow_table.column(pk)[i].as_py() for pk in self.pk_list)
-                    pk_values_set.add(pk_tuple)
-
                 # Build delete predicate: (rate_date='2024-01-01' AND source='x' AND base_currency='USD') OR ...
-                delete_predicates = []
-                for pk_values in pk_values_set:
-                    row_predicates = []
-                    for pk, value in zip(self.pk_list, pk_values):
-                        # Convert all values to strings and quote them (handles dates, strings, etc.)
-                        # Dates come in as datetime.date objects and need to be converted to string
-                        value_str = str(value)
-                        row_predicates.append(f"{pk} = '{value_str}'")
-                    delete_predicates.append(f"({' AND '.join(row_predicates)})")
+                pk_values_set, delete_predicates = self._build_delete_predicates(arrow_table)
 
                 # Delete existing rows with matching keys (idempotency)
                 if delete_predicates:
@@ -532,7 +586,7 @@ class IcebergLoader:
                 
                 # Initialize DynamoDBClient wrapper
                 metadata_table = self.dynamodb_tables.get("iceberg_metadata", "iceberg_metadata")
-                ddb = DynamoDBClient(table_name=metadata_table)
+                ddb = DynamoDBClient.from_settings(table_name=metadata_table)
                 ddb.put_item({
                     "table_name": table_name,
                     "metadata_location": latest_metadata_location,
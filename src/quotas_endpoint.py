@@ -4,8 +4,9 @@ Outputs JSON with available APIs for Kestra to parse
 """
 
 import os
-import json
 import sys
+import logging
+import orjson
 from utils.quota_manager import QuotaManager
 from utils.logging_config import root_logger as logger
 from utils.helpers import load_config
@@ -20,22 +21,22 @@ def main():
 
     try:
         # Initialize quota manager
-        manager = QuotaManager(endpoint_url=endpoint)
+        manager = QuotaManager.get(endpoint_url=endpoint)
 
-        # Get simplified statuses
-        # returns dict: {'frankfurter': True, 'exchangerate': False, ...}
-        real_stats = manager.get_all_api_statuses()
+        # Single round of reads: per-API stats plus simplified statuses
+        # statuses: {'frankfurter': True, 'exchangerate': False, ...}
+        stats, real_stats = manager.get_stats_and_statuses()
 
         # Log details for debugging
-        stats = manager.get_usage_stats()
-        for s in stats:
-             logger.info(
-                f"{s['api_source']}: {s['requests']}/{s['quota']} "
-                f"({s['usage_pct']}%), remaining: {s['remaining']}, "
-                f"status: {s['status']}"
-            )
-
-        print(f"::{{\"outputs\": {json.dumps(real_stats)} }}::")
+        if logger.isEnabledFor(logging.INFO):
+            for s in stats:
+                logger.info(
+                    f"{s['api_source']}: {s['requests']}/{s['quota']} "
+                    f"({s['usage_pct']}%), remaining: {s['remaining']}, "
+                    f"status: {s['status']}"
+                )
+
+        print(f"::{{\"outputs\": {orjson.dumps(real_stats).decode()} }}::")
         logger.info(f"Final Statuses: {real_stats}")
         sys.exit(0)
 
@@ -44,7 +45,7 @@ def main():
 
         # Output fallback JSON (fail-open)
         logger.info(f"Fallback to: {available_apis}")
-        print(f"::{{\"outputs\": {json.dumps(available_apis)} }}::")
+        print(f"::{{\"outputs\": {orjson.dumps(available_apis).decode()} }}::")
 
         sys.exit(0)
 
@@ -7,19 +7,57 @@ Uses shared configuration and DynamoDB utility.
 
 import os
 import sys
-import duckdb
+import time
 import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from itertools import islice
 from datetime import datetime, timedelta, timezone
-from decimal import Decimal
-from typing import Dict, Any
+from typing import Dict, Any, List
 from pathlib import Path
 from utils.helpers import load_config,parse_env_vars_config
 from utils.dynamodb import DynamoDBClient
-from utils.logging_config import root_logger as logger
+from utils.duckdb_pool import get_read_connection, close_read_connection
+from utils.logging_config import root_logger as logger, enable_queue_logging
 
 # ENV VARS FOR JOB CONFIG 
 JOB_CONFIG_FILE = "settings.yaml"
 
+# Fallback locations for the analytics database when DUCKDB_PATH does not exist
+DUCKDB_FALLBACK_PATHS = (Path("data/analytics.duckdb"), Path("dbt_project/analytics.duckdb"))
+
+# BatchWriteItem limits / parallelism
+BATCH_SIZE = 25  # DynamoDB hard limit per BatchWriteItem call
+MAX_WORKERS = 16
+MAX_PENDING_BATCHES = 4 * MAX_WORKERS  # Bounds rows held in memory while DuckDB keeps reading
+READ_BATCH_ROWS = 10_000  # Arrow record batch size streamed from DuckDB
+MAX_RETRIES = 8
+
+# DuckDB read settings: use every core, bound memory, row order is irrelevant for the sync
+DUCKDB_CONFIG = {
+    "threads": str(os.cpu_count() or 1),
+    "memory_limit": os.getenv("DUCKDB_MEMORY_LIMIT", "2GB"),
+    "preserve_insertion_order": "false",
+}
+
+# Fixed sync schema: numeric columns go out as DynamoDB 'N', everything else as 'S'
+NUMERIC_COLUMNS = ("exchange_rate", "inverse_rate", "consensus_variance")
+NULL_VALUE = {"NULL": True}
+
+
+def write_batch(client, table_name: str, put_requests: List[Dict[str, Any]]) -> int:
+    """
+    Write up to 25 pre-serialized (wire-format) PutRequests with one low-level BatchWriteItem call.
+    Resubmits UnprocessedItems with exponential backoff, as DynamoDB requires.
+    """
+    request_items = {table_name: put_requests}
+    for attempt in range(MAX_RETRIES):
+        response = client.batch_write_item(RequestItems=request_items)
+        request_items = response.get("UnprocessedItems") or {}
+        if not request_items:
+            return len(put_requests)
+        time.sleep(min(2 ** attempt * 0.05, 2))
+    raise RuntimeError(f"{len(request_items.get(table_name, []))} items still unprocessed after {MAX_RETRIES} attempts")
+
 
 def sync_rates_to_dynamodb():
     try:
@@ -34,105 +72,134 @@ def sync_rates_to_dynamodb():
     raw_duckdb_path = os.getenv("DUCKDB_PATH", "analytics.duckdb")
     table_name = config["DYNAMODB_TABLE_NAME"]
     
-    duckdb_path = Path(raw_duckdb_path)
-    
-    # Verify DuckDB path
-    if not duckdb_path.exists():
-        # Fallback 1: Check in current directory strictly
-        local_fallback = Path("data/analytics.duckdb")
-        
-        # Fallback 2: Check in dbt_project/
-        project_fallback = Path("dbt_project/analytics.duckdb")
-
-        if local_fallback.exists():
-             logger.info(f"Found database at local fallback: {local_fallback}")
-             duckdb_path = local_fallback
-        elif project_fallback.exists():
-             logger.info(f"Found database at project fallback: {project_fallback}")
-             duckdb_path = project_fallback
-        else:
-            logger.error(f"DuckDB database not found at {duckdb_path} (absolute: {duckdb_path.absolute()})")
-            logger.error("Please ensure 'dbt run' completes successfully and creates the file.")
-            sys.exit(1)
+    # Verify DuckDB path: configured path first, then local (data/) and dbt_project/ fallbacks
+    # is_file() is a single stat per candidate; the first hit wins
+    candidates = (Path(raw_duckdb_path), *DUCKDB_FALLBACK_PATHS)
+    duckdb_path = next((candidate for candidate in candidates if candidate.is_file()), None)
+
+    if duckdb_path is None:
+        primary = candidates[0]
+        logger.error(f"DuckDB database not found at {primary} (absolute: {primary.absolute()})")
+        logger.error("Please ensure 'dbt run' completes successfully and creates the file.")
+        sys.exit(1)
+    if duckdb_path is not candidates[0]:
+        logger.info(f"Found database at fallback: {duckdb_path}")
 
     logger.info(f"Starting DynamoDB Sync. Source: {duckdb_path}, Target: {table_name}")
 
     # ---  Read from DuckDB ---
     try:
         # Use str(duckdb_path) because DuckDB python API might expect string
-        con = duckdb.connect(str(duckdb_path), read_only=True)
+        # Cursor off the shared read-only connection (reused across calls in the same process)
+        con = get_read_connection(str(duckdb_path), **DUCKDB_CONFIG).cursor()
     except Exception as e:
         logger.error(f"Failed to connect to DuckDB: {e}")
         sys.exit(1)
 
+    def release_duckdb():
+        # Close the cursor and the pooled connection now (not at interpreter exit), so the
+        # file lock is released for dbt and the close is logged while logging is still up
+        con.close()
+        close_read_connection(str(duckdb_path))
+
     # Query latest rate date
+    # Row formatting is done here (vectorized): ISO rate_date, fixed-scale decimal text for the
+    # DynamoDB 'N' rates (no Python Decimal objects) and one constant sync timestamp.
+    # DECIMAL(38, 18): 20 integer digits so large inverse rates never overflow, 18 decimals so
+    # tiny rates (e.g. USD->BTC ~1e-5) keep ~13 significant digits
     query = """
+        WITH latest AS (
+            SELECT MAX(rate_date) AS rate_date FROM main_validation.fact_rates_validated
+        )
         SELECT 
-            f.rate_date,
+            strftime(CAST(f.rate_date AS DATE), '%Y-%m-%d') AS rate_date,
             f.base_currency,
             f.target_currency,
             c.country_name,
             c.region,
-            f.exchange_rate,
-            f.inverse_rate,
-            f.consensus_variance,
+            CAST(CAST(f.exchange_rate AS DECIMAL(38, 18)) AS VARCHAR) AS exchange_rate,
+            CAST(CAST(f.inverse_rate AS DECIMAL(38, 18)) AS VARCHAR) AS inverse_rate,
+            CAST(CAST(f.consensus_variance AS DECIMAL(38, 18)) AS VARCHAR) AS consensus_variance,
             f.validation_status,
-            concat(f.base_currency, '/', f.target_currency) as currency_pair
+            concat(f.base_currency, '/', f.target_currency) as currency_pair,
+            CAST(? AS VARCHAR) AS synced_at
         FROM main_validation.fact_rates_validated f
+        JOIN latest l
+            ON f.rate_date = l.rate_date
         LEFT JOIN main_analytics.dim_countries c 
             ON f.target_currency = c.currency_code
-        WHERE f.rate_date = (SELECT MAX(rate_date) FROM main_validation.fact_rates_validated)
     """
     
-    logger.info("Executing DuckDB Query...")
-    try:
-        results = con.execute(query).fetchall()
-        columns = [desc[0] for desc in con.description]
-        logger.info(f"Fetched {len(results)} rows.")
-    except Exception as e:
-        logger.error(f"Failed to execute query: {e}")
-        con.close()
-        sys.exit(1)
-        
-    con.close()
-        
-    if not results:
-        logger.info("No data to sync.")
-        return
-
     # ---  Write to DynamoDB ---
     try:
-        ddb_client = DynamoDBClient(
+        ddb_client = DynamoDBClient.from_settings(
             table_name=table_name
         )
     except Exception as e:
         logger.error(f"Failed to initialize DynamoDB client: {e}")
+        release_duckdb()
+        sys.exit(1)
+
+    logger.info("Executing DuckDB Query...")
+    try:
+        # Arrow record batches: peak memory is one read batch
+        synced_at = datetime.now(timezone.utc).isoformat()
+        reader = con.execute(query, [synced_at]).fetch_record_batch(READ_BATCH_ROWS)
+        columns = reader.schema.names
+    except Exception as e:
+        logger.error(f"Failed to execute query: {e}")
+        release_duckdb()
         sys.exit(1)
     
     logger.info(f"Writing to DynamoDB Table: {table_name}...")
     
     ids_synced = 0
-    # Use batch_writer from the underlying table resource for efficiency
-    with ddb_client.table.batch_writer() as batch:
-        for row in results:
-            item = dict(zip(columns, row))
-            
-            # Type Conversions
-            if hasattr(item['rate_date'], 'isoformat'):
-                item['rate_date'] = item['rate_date'].isoformat()
-            
-            # Decimal conversion for DynamoDB
-            for key in ['exchange_rate', 'inverse_rate', 'consensus_variance']:
-                if item.get(key) is not None:
-                     item[key] = Decimal(str(item[key]))
-            
-            # Add Sync Metadata
-            item['synced_at'] = datetime.now(timezone.utc).isoformat()
-            
-            batch.put_item(Item=item)
-            ids_synced += 1
+    # Parallel BatchWriteItem calls (I/O bound) through the low-level client.
+    # Items are serialized by hand from the fixed schema, skipping the resource TypeSerializer.
+    type_tags = ["N" if col in NUMERIC_COLUMNS else "S" for col in columns]
+    client = ddb_client.client
+
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    pending = set()
+    try:
+        # DuckDB produces the next record batch while the pool drains the previous ones
+        for record_batch in reader:
+            # Serialize column-wise, then build each item dict once straight into its PutRequest
+            wire_columns = [
+                [NULL_VALUE if value is None else {tag: str(value)} for value in col.to_pylist()]
+                for col, tag in zip(record_batch.columns, type_tags)
+            ]
+            rows = iter(zip(*wire_columns))
+            while chunk := [
+                {"PutRequest": {"Item": dict(zip(columns, row))}}
+                for row in islice(rows, BATCH_SIZE)
+            ]:
+                # Backpressure per chunk: never more than MAX_PENDING_BATCHES queued writes
+                while len(pending) >= MAX_PENDING_BATCHES:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    ids_synced += sum(future.result() for future in done)
+                pending.add(executor.submit(write_batch, client, table_name, chunk))
+
+        for future in as_completed(pending):
+            ids_synced += future.result()
+    except Exception as e:
+        # fetch_record_batch is lazy: DuckDB execution errors surface here, mid-stream.
+        # Drop queued writes instead of draining them; only in-flight calls are awaited.
+        executor.shutdown(cancel_futures=True)
+        logger.error(f"Failed while streaming rows to DynamoDB after {ids_synced} items: {e}")
+        release_duckdb()
+        sys.exit(1)
+
+    executor.shutdown()
+    release_duckdb()
+
+    if ids_synced == 0:
+        logger.info("No data to sync.")
+        return
             
     logger.info(f"Successfully synced {ids_synced} items to DynamoDB.")
 
 if __name__ == "__main__":
+    # Bulk path: keep log writes off the writer threads
+    enable_queue_logging(logger)
     sync_rates_to_dynamodb()
@@ -0,0 +1,41 @@
+import atexit
+import threading
+from typing import Dict, Optional
+import duckdb
+from utils.logging_config import root_logger as logger
+
+_connections: Dict[str, duckdb.DuckDBPyConnection] = {}
+_lock = threading.Lock()
+
+
+def get_read_connection(path: str, **config: str) -> duckdb.DuckDBPyConnection:
+    """
+    Shared read-only DuckDB connection per database path, opened once per process.
+    Callers should run queries on a `.cursor()` of it, so the catalog and buffer manager
+    are reused across calls. `config` only applies when the connection is first opened.
+
+    While held, the connection keeps a lock on the file: other processes can still open it
+    read-only, but writers (e.g. `dbt run`) fail to attach, and this connection keeps
+    reading its snapshot. Call close_read_connection() before dbt writes to the file.
+    """
+    with _lock:
+        con = _connections.get(path)
+        if con is None:
+            con = duckdb.connect(path, read_only=True, config=config)
+            _connections[path] = con
+            logger.info(f"Opened read-only DuckDB connection: {path}")
+        return con
+
+
+def close_read_connection(path: Optional[str] = None) -> None:
+    """Close the shared connection for `path` (all of them when None), releasing the file lock."""
+    with _lock:
+        paths = [path] if path is not None else list(_connections)
+        for p in paths:
+            con = _connections.pop(p, None)
+            if con is not None:
+                con.close()
+                logger.info(f"Closed read-only DuckDB connection: {p}")
+
+
+atexit.register(close_read_connection)
@@ -1,41 +1,141 @@
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from typing import Optional, Dict, Any, Tuple, List
+from functools import lru_cache
 from utils.logging_config import root_logger as logger
 from utils.helpers import parse_env_vars_config, load_config
-import os,sys
+import os,sys,time
 
 # ENV VARS CONFIG FILE
 CONFIG_FILE = "settings.yaml"
 
+# BatchGetItem hard limit on keys per request
+BATCH_GET_LIMIT = 100
+
+# Default botocore config: adaptive (client-side rate limited) retries absorb throttling,
+# and a large keep-alive pool lets concurrent BatchWriteItem calls actually run in parallel
+DEFAULT_CLIENT_CONFIG = Config(
+    max_pool_connections=64,
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    tcp_keepalive=True
+)
+
+
+@lru_cache(maxsize=1)
+def _get_session() -> boto3.session.Session:
+    """Single boto3 session per process, so credential resolution runs once."""
+    return boto3.session.Session()
+
+
+@lru_cache(maxsize=8)
+def _get_resource(
+    endpoint_url: Optional[str],
+    region_name: Optional[str],
+    aws_access_key_id: Optional[str],
+    aws_secret_access_key: Optional[str],
+    config: Optional[Config] = None
+):
+    """DynamoDB resource memoized per connection settings (service model loads once)."""
+    return _get_session().resource(
+        "dynamodb",
+        endpoint_url=endpoint_url,
+        region_name=region_name,
+        aws_access_key_id=aws_access_key_id,
+        aws_secret_access_key=aws_secret_access_key,
+        config=config
+    )
+
+
+@lru_cache(maxsize=8)
+def _get_client(
+    endpoint_url: Optional[str],
+    region_name: Optional[str],
+    aws_access_key_id: Optional[str],
+    aws_secret_access_key: Optional[str],
+    config: Optional[Config] = None
+):
+    """Low-level DynamoDB client memoized per connection settings."""
+    return _get_session().client(
+        "dynamodb",
+        endpoint_url=endpoint_url,
+        region_name=region_name,
+        aws_access_key_id=aws_access_key_id,
+        aws_secret_access_key=aws_secret_access_key,
+        config=config
+    )
+
+
 class DynamoDBClient:
     """Simple wrapper around boto3 DynamoDB Table operations."""
 
-    def __init__(self, table_name: str, endpoint_url: Optional[str] = None, region_name: Optional[str] = "us-east-1"):
-
-        self._load_environment_config()
-        dynamodb_kwargs = {}
+    def __init__(
+        self,
+        table_name: str,
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = "us-east-1",
+        aws_access_key_id: Optional[str] = None,
+        aws_secret_access_key: Optional[str] = None,
+        client_config: Optional[Config] = None
+    ):
         try:
-            dynamodb_kwargs["endpoint_url"] = endpoint_url if endpoint_url else self.config.get("DYNAMODB_ENDPOINT",None)
-            dynamodb_kwargs["region_name"] = region_name if region_name else self.config.get("DYNAMODB_AWS_DEFAULT_REGION",None)                
-            dynamodb_kwargs["aws_access_key_id"] = self.config.get("DYNAMODB_AWS_ACCESS_KEY_ID",None)
-            dynamodb_kwargs["aws_secret_access_key"] = self.config.get("DYNAMODB_AWS_SECRET_ACCESS_KEY",None)
-            self.table = boto3.resource("dynamodb", **dynamodb_kwargs).Table(table_name)
+            self._dynamodb_kwargs = {
+                "endpoint_url": endpoint_url,
+                "region_name": region_name,
+                "aws_access_key_id": aws_access_key_id,
+                "aws_secret_access_key": aws_secret_access_key,
+                "config": client_config or DEFAULT_CLIENT_CONFIG,
+            }
+            self.table = _get_resource(**self._dynamodb_kwargs).Table(table_name)
             logger.info(f"DynamoDB table initialized: {table_name}")
         except Exception as e:
             logger.error(f"Failed to initialize DynamoDB table: {e}")
             sys.exit(1)
 
-    
-    def _load_environment_config(self)->None:
+    @classmethod
+    def from_settings(
+        cls,
+        table_name: str,
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = None,
+        client_config: Optional[Config] = None
+    ) -> "DynamoDBClient":
+        """
+        Build a client from the `dynamodb_client` section of settings.yaml (env vars + defaults).
+        Explicit endpoint/region arguments take precedence over the configured values.
+        """
         try:
             settings = load_config(CONFIG_FILE)
-            job_config = settings.get("dynamodb_client", {})
-            self.config = parse_env_vars_config(job_config)
+            config = parse_env_vars_config(settings.get("dynamodb_client", {}))
         except Exception as e:
             logger.error(f"Failed to load configuration: {e}")
             sys.exit(1)
 
+        return cls(
+            table_name,
+            endpoint_url=endpoint_url or config.get("DYNAMODB_ENDPOINT"),
+            region_name=region_name or config.get("DYNAMODB_AWS_DEFAULT_REGION"),
+            aws_access_key_id=config.get("DYNAMODB_AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=config.get("DYNAMODB_AWS_SECRET_ACCESS_KEY"),
+            client_config=client_config
+        )
+
+    def for_thread(self) -> "DynamoDBClient":
+        """
+        Copy of this client bound to its own boto3 session and resource, for use on another thread.
+        boto3 resources are not thread-safe, so background threads must not share the cached one.
+        """
+        thread_copy = object.__new__(DynamoDBClient)
+        thread_copy._dynamodb_kwargs = self._dynamodb_kwargs
+        thread_copy.table = boto3.session.Session().resource(
+            "dynamodb", **self._dynamodb_kwargs
+        ).Table(self.table.name)
+        return thread_copy
+
+    @property
+    def client(self):
+        """Low-level DynamoDB client (wire-format items, no resource-layer type serialization)."""
+        return _get_client(**self._dynamodb_kwargs)
 
     def get_item(self, key: Dict[str, Any]) -> Optional[Dict]:
         try:
@@ -45,12 +145,57 @@ class DynamoDBClient:
             logger.error(f"Error fetching item {key}: {e}")
             return None
 
-    def put_item(self, item: Dict[str, Any]) -> bool:
+    def batch_get_item(self, keys: List[Dict[str, Any]], max_retries: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """
+        Fetch many items by primary key with BatchGetItem.
+        Chunks at the 100-key API limit and retries UnprocessedKeys with exponential backoff.
+        """
+        items: List[Dict[str, Any]] = []
+        client = self.table.meta.client  # Resource client: Python types in/out
+        try:
+            for start in range(0, len(keys), BATCH_GET_LIMIT):
+                request = {self.table.name: {"Keys": keys[start:start + BATCH_GET_LIMIT]}}
+                for attempt in range(max_retries):
+                    resp = client.batch_get_item(RequestItems=request)
+                    items.extend(resp.get("Responses", {}).get(self.table.name, []))
+                    request = resp.get("UnprocessedKeys") or {}
+                    if not request:
+                        break
+                    time.sleep(min(2 ** attempt * 0.05, 2))
+                else:
+                    logger.error(f"BatchGetItem left {len(request[self.table.name]['Keys'])} keys unprocessed")
+            return items
+        except ClientError as e:
+            logger.error(f"Error batch fetching {len(keys)} items: {e}")
+            return None
+
+    def put_item(
+        self,
+        item: Dict[str, Any],
+        condition_expression: Optional[str] = None,
+        expression_names: Optional[dict] = None,
+        expression_values: Optional[dict] = None
+    ) -> bool:
+        """
+        PutItem wrapper. Returns False on error.
+        When a `condition_expression` is given and fails, the ClientError
+        (ConditionalCheckFailedException) is re-raised so callers can react to it.
+        """
         try:
-            self.table.put_item(Item=item)
-            logger.debug(f"Inserted item: {item}")
+            kwargs = {"Item": item}
+            if condition_expression:
+                kwargs["ConditionExpression"] = condition_expression
+            if expression_names:
+                kwargs["ExpressionAttributeNames"] = expression_names
+            if expression_values:
+                kwargs["ExpressionAttributeValues"] = expression_values
+
+            self.table.put_item(**kwargs)
+            logger.debug("Inserted item: %s", item)
             return True
         except ClientError as e:
+            if condition_expression and e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                raise
             logger.error(f"Error inserting item {item}: {e}")
             return False
 
@@ -59,23 +204,34 @@ class DynamoDBClient:
         key: dict, 
         update_expression: str, 
         expression_values: dict, 
-        expression_names: Optional[dict] = None
+        expression_names: Optional[dict] = None,
+        condition_expression: Optional[str] = None,
+        return_values: str = "ALL_NEW"
     ) -> Optional[dict]:
+        """
+        UpdateItem wrapper. Returns the item attributes per `return_values`, or None on error.
+        When a `condition_expression` is given and fails, the ClientError
+        (ConditionalCheckFailedException) is re-raised so callers can react to it.
+        """
         try:
             kwargs = {
                 "Key": key,
                 "UpdateExpression": update_expression,
                 "ExpressionAttributeValues": expression_values,
-                "ReturnValues": "ALL_NEW"
+                "ReturnValues": return_values
             }
             if expression_names:
                 kwargs["ExpressionAttributeNames"] = expression_names
+            if condition_expression:
+                kwargs["ConditionExpression"] = condition_expression
 
             resp = self.table.update_item(**kwargs)
-            logger.debug(f"Updated item {key}: {resp.get('Attributes')}")
+            logger.debug("Updated item %s: %s", key, resp.get("Attributes"))
             return resp.get("Attributes")
 
         except ClientError as e:
+            if condition_expression and e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                raise
             logger.error(f"Error updating item {key}: {e}")
             return None
 
@@ -85,9 +241,11 @@ class DynamoDBClient:
         expression_values: Dict[str, Any], 
         limit: Optional[int] = None, 
         scan_index_forward: bool = True,
+        projection_expression: Optional[str] = None,
+        expression_names: Optional[Dict[str, str]] = None,
         **kwargs
     ) -> Optional[List[Dict[str, Any]]]:
-        """Generic query wrapper with argument mapping."""
+        """Generic query wrapper with argument mapping. `projection_expression` trims returned attributes."""
         try:
             query_kwargs = {
                 "KeyConditionExpression": key_condition_expression,
@@ -96,6 +254,10 @@ class DynamoDBClient:
             }
             if limit:
                 query_kwargs["Limit"] = limit
+            if projection_expression:
+                query_kwargs["ProjectionExpression"] = projection_expression
+            if expression_names:
+                query_kwargs["ExpressionAttributeNames"] = expression_names
             
             # Allow passing other kwargs directly if they match Boto3 names
             query_kwargs.update(kwargs)
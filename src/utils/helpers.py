@@ -1,12 +1,31 @@
 from pathlib import Path
 import yaml
-from typing import Dict,Any
+from typing import Dict,Any,Mapping
+from functools import lru_cache
+from types import MappingProxyType
 from utils.logging_config import root_logger as logger
 import os,sys
 
-def load_config(config_name: str) -> Dict:
+# libyaml C loader when PyYAML was built with it, pure-Python SafeLoader otherwise
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+def _freeze(value: Any) -> Any:
+    """Recursively convert dicts to read-only mappings and lists to tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+@lru_cache(maxsize=None)
+def load_config(config_name: str) -> Mapping:
     """
     Load a YAML configuration file from the 'config' directory.
+    Parsed once per process; returned deep-frozen (nested mappings read-only, lists as tuples)
+    so callers cannot mutate the shared cached config.
     
     Args:
         config_name: Filename (e.g. 'apis.yaml', 'storage.yaml')
@@ -14,16 +33,15 @@ def load_config(config_name: str) -> Dict:
     # Assuming standard structure: src/utils/helpers.py -> src/config/
     path = Path(__file__).parent.parent / "config" / config_name
     
-    if not path.exists():
+    try:
+        config = yaml.load(path.read_text(), Loader=_YamlLoader)
+    except FileNotFoundError:
         raise FileNotFoundError(f"Config file not found: {path}")
 
-    with open(path, "r") as f:
-        config = yaml.safe_load(f)
-
     if not isinstance(config, dict):
         raise ValueError(f"Config {config_name} must be a dictionary at the top level")
     
-    return config
+    return _freeze(config)
 
 def parse_env_vars_config(job_config: Dict[str, Any]) -> Dict[str, str]:
     """
@@ -35,19 +53,12 @@ def parse_env_vars_config(job_config: Dict[str, Any]) -> Dict[str, str]:
     optional = env_vars.get('optional', [])
     defaults = job_config.get('defaults', {})
     
-    parsed_config = {}
-    
-    # Process all potential keys
-    all_keys = set(required + optional)
-    
-    for key in all_keys:
-        # Get from env, then default, then None
-        val = os.getenv(key, defaults.get(key))
-        
-        parsed_config[key] = val
+    # Process all potential keys in one pass: env, then default, then None
+    environ = os.environ
+    parsed_config = {key: environ.get(key, defaults.get(key)) for key in (*required, *optional)}
     
     # Check required
-    missing = [key for key in required if not parsed_config.get(key)]
+    missing = [key for key in required if not parsed_config[key]]
     if missing:
         logger.error(f"Missing required environment variables: {', '.join(missing)}")
         sys.exit(1)
@@ -1,5 +1,9 @@
+import atexit
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict
 
 # Root logger configuration
 def setup_logger(name: str = "makerates", level: int = logging.INFO) -> logging.Logger:
@@ -24,5 +28,40 @@ def setup_logger(name: str = "makerates", level: int = logging.INFO) -> logging.
 
     return logger
 
+# Active queue listeners, keyed by logger name
+_queue_listeners: Dict[str, QueueListener] = {}
+
+def enable_queue_logging(logger: logging.Logger) -> QueueListener:
+    """
+    Move the logger's handler I/O onto a background thread.
+    Records are put on a queue (QueueHandler) and written by a QueueListener,
+    so bulk loops never block on stdout writes. At exit the listener is stopped (and flushed)
+    and the original handlers are restored for any later records.
+    """
+    if logger.name in _queue_listeners:
+        return _queue_listeners[logger.name]
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handlers = list(logger.handlers)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    queue_handler = QueueHandler(log_queue)
+    for h in handlers:
+        logger.removeHandler(h)
+    logger.addHandler(queue_handler)
+
+    def stop() -> None:
+        # Drain the queue, then hand the original handlers back so records logged by
+        # atexit hooks that run after this one are still written (not queued to nowhere)
+        listener.stop()
+        logger.removeHandler(queue_handler)
+        for h in handlers:
+            logger.addHandler(h)
+        _queue_listeners.pop(logger.name, None)
+
+    listener.start()
+    atexit.register(stop)
+    _queue_listeners[logger.name] = listener
+    return listener
+
 # Optional: automatically configure root logger when imported
 root_logger = setup_logger()
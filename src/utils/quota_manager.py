@@ -1,39 +1,137 @@
-from datetime import datetime, timezone
-from typing import Optional, Dict, List
+import time
+import atexit
+import threading
+from collections import namedtuple, defaultdict
+from typing import Optional, Dict, List, Tuple, DefaultDict
 from utils.helpers import load_config
+from botocore.exceptions import ClientError
 from utils.dynamodb import DynamoDBClient
 from utils.logging_config import root_logger as logger
+from utils.timezone_helper import get_utc_now
 
 CONFIG_FILE = "apis.yaml"
 
+# How long an active cycle item is served from memory before re-reading DynamoDB
+CYCLE_CACHE_SECONDS = 60
+
+# Quota cycle length (rolling window, enforced via the item's TTL)
+CYCLE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# Write-behind: pending increments are merged and flushed at this interval (or sooner past the threshold)
+FLUSH_INTERVAL_SECONDS = 1.0
+FLUSH_THRESHOLD = 50
+
+# UpdateItem templates; only the expression values change per call (botocore does not mutate these)
+_RECORD_UPDATE_EXPR = "ADD request_count :inc SET last_request_at = :ts, updated_at = :ts, last_status = :st"
+_RECORD_CONDITION_EXPR = "#ttl > :now"
+_RECORD_NAMES = {"#ttl": "ttl"}
+# Replace only a missing key, or an item that is not a live cycle (no ttl, e.g. a bare throttle marker, or expired)
+_NEW_CYCLE_CONDITION_EXPR = "attribute_not_exists(tracking_date) OR attribute_not_exists(#ttl) OR #ttl < :now"
+_THROTTLE_UPDATE_EXPR = "SET #status = :throttled, throttled_at = :timestamp"
+_THROTTLE_NAMES = {"#status": "status"}
+
+# Attributes read back from a cycle item (stats, TTL check, cached cycle); ttl/status are reserved words
+_CYCLE_PROJECTION = "api_source, tracking_date, #t, request_count, quota_limit, #s, failover_to, created_at"
+_CYCLE_PROJECTION_NAMES = {"#t": "ttl", "#s": "status"}
+
+# Per-API settings copied onto every new cycle item
+_ApiCfg = namedtuple("_ApiCfg", "quota_limit failover_to priority")
+
 class QuotaManager:
     """Manages API quotas with automatic failover."""
 
-    def __init__(self, table_name: Optional[str] = None, endpoint_url: Optional[str] = None):
+    # Shared instances per (table_name, endpoint_url), see get()
+    _instances: Dict[Tuple[Optional[str], Optional[str]], "QuotaManager"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, table_name: Optional[str] = None, endpoint_url: Optional[str] = None) -> "QuotaManager":
+        """
+        Return the process-wide QuotaManager for this table/endpoint, creating it on first use.
+        State is intentionally shared between callers: the write-behind queue and the cycle cache.
+        """
+        key = (table_name, endpoint_url)
+        with cls._instances_lock:
+            inst = cls._instances.get(key)
+            if inst is None:
+                inst = cls._instances[key] = cls(table_name, endpoint_url)
+        return inst
+
+    def __init__(self, table_name: Optional[str] = None, endpoint_url: Optional[str] = None, sync: bool = False):
         # Load table name from settings if not provided
         if table_name is None:
             settings = load_config("settings.yaml")
             table_name = settings.get("dynamodb_tables", {}).get("api_quota_tracker", None)
 
-        self.dynamodb = DynamoDBClient(table_name, endpoint_url)
+        self._dynamodb = DynamoDBClient.from_settings(table_name, endpoint_url)
         self.apis_config = load_config(CONFIG_FILE)
         self.api_priority = sorted(
             self.apis_config.keys(),
             key=lambda k: self.apis_config[k]["priority"]
         )
         #list(self.apis_config.keys())
+        self._api_names: Tuple[str, ...] = tuple(self.api_priority)
+        self._api_cfg: Dict[str, _ApiCfg] = {
+            a: _ApiCfg(
+                quota_limit=cfg.get("quota_limit", 100),
+                failover_to=cfg.get("failover_to"),
+                priority=cfg.get("priority", 99)
+            )
+            for a, cfg in self.apis_config.items()
+        }
+
+        # Latest known cycle key (tracking_date) per API, so repeat reads collapse into one BatchGetItem
+        self._cycle_dates: Dict[str, str] = {}
+
+        # Short-lived cache of active cycle items: api_source -> (monotonic expiry, item)
+        self._cycle_cache: Dict[str, Tuple[float, Dict]] = {}
+
+        # Write-behind state: api_source -> merged increment count / last outcome
+        # sync=True writes every request immediately (no background thread)
+        self._sync = sync
+        self._pending: DefaultDict[str, int] = defaultdict(int)
+        self._pending_status: Dict[str, bool] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_wakeup = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        # The flush thread gets its own boto3 resource (resources are not thread-safe)
+        self._flush_dynamodb: Optional[DynamoDBClient] = None
+
+    @property
+    def dynamodb(self) -> DynamoDBClient:
+        """DynamoDB wrapper for the calling thread: the flush thread never touches the shared resource."""
+        if self._flush_dynamodb is not None and threading.current_thread() is self._flush_thread:
+            return self._flush_dynamodb
+        return self._dynamodb
+
+    def _get_cached_cycle(self, api_source: str) -> Optional[Dict]:
+        """Return the cached active cycle if the cache entry is fresh and the cycle itself has not expired."""
+        cache_expiry, item = self._cycle_cache.get(api_source, (0, None))
+        if item is not None and time.monotonic() < cache_expiry and self._is_active(item):
+            return item
+        return None
+
+    def _cache_cycle(self, api_source: str, item: Dict) -> None:
+        self._cycle_cache[api_source] = (time.monotonic() + CYCLE_CACHE_SECONDS, item)
 
     def _get_active_cycle(self, api_source: str) -> Optional[Dict]:
         """
         Find the active quota cycle (30-day window).
         Returns the item if a valid cycle exists, else None.
         """
+        cached = self._get_cached_cycle(api_source)
+        if cached:
+            return cached
+
         # Query for latest item (Sort Key DESC)
         response = self.dynamodb.query(
             key_condition_expression="api_source = :api",
             expression_values={":api": api_source},
             limit=1,
-            scan_index_forward=False
+            scan_index_forward=False,
+            projection_expression=_CYCLE_PROJECTION,
+            expression_names=_CYCLE_PROJECTION_NAMES
         )
         items = response if response else [] # DynamoDBClient.query returns list
         
@@ -41,92 +139,218 @@ class QuotaManager:
             return None
             
         latest_item = items[0]
-        # Check validity: Is NOW < TTL?
-        # Requirement: "INCREMENT ... if curr date < ttl"
-        ttl = float(latest_item.get("ttl", 0))
-        now_ts = datetime.now(timezone.utc).timestamp()
-        
-        if now_ts < ttl:
+        self._cycle_dates[api_source] = latest_item["tracking_date"]
+
+        if self._is_active(latest_item):
+            self._cache_cycle(api_source, latest_item)
             return latest_item
         else:
-            logger.info(f"Cycle for {api_source} expired (TTL: {ttl} < Now: {now_ts})")
+            logger.info("Cycle for %s expired (TTL: %s)", api_source, latest_item.get('ttl'))
             return None
 
+    @staticmethod
+    def _is_active(item: Dict) -> bool:
+        """
+        Check validity: Is NOW < TTL?
+        Requirement: "INCREMENT ... if curr date < ttl"
+        Table TTL on 'ttl' (scripts/init_dynamodb.py) only garbage-collects expired cycles;
+        deletion can lag up to 48h, so the latest item is not necessarily active and this check stays.
+        """
+        return time.time() < float(item.get("ttl", 0))
+
     def get_all_api_statuses(self) -> Dict[str, bool]:
         """
         Returns a dictionary of API statuses (available/unavailable) for all configured APIs.
         Used by the Kestra pipeline to determine which extractors can run.
         """
+        _, status_map = self.get_stats_and_statuses()
+        return status_map
+
+    def get_stats_and_statuses(self) -> Tuple[List[Dict], Dict[str, bool]]:
+        """
+        Fetch usage stats once and derive the availability map from them.
+        Returns (stats_list, statuses_dict) so callers needing both avoid a second round of DynamoDB reads.
+        """
         stats = self.get_usage_stats()
-        status_map = {}
-        
+
+        # API is available if active AND has quota
+        stats_by_api = {
+            s['api_source']: s.get('status') == 'active' and s.get('remaining', 0) > 0
+            for s in stats
+        }
         # Default fail-open for configured APIs if not in stats (though get_usage_stats inits them)
-        for api in self.apis_config.keys():
-            status_map[api] = True
+        status_map = {api: stats_by_api.get(api, True) for api in self._api_names}
 
-        for s in stats:
-            api_name = s['api_source']
-            is_active = s.get('status') == 'active'
-            has_quota = s.get('remaining', 0) > 0
-            
-            # API is available if active AND has quota
-            status_map[api_name] = is_active and has_quota
-            
-        return status_map
+        return stats, status_map
 
     def record_request(self, api_source: str, success: bool = True, date: Optional[str] = None) -> bool:
+        """
+        Count one request against the API's quota.
+        Write-behind by default: the increment is queued and merged into the next background flush,
+        so the quota verdict (throttling) is applied at flush time and this returns True.
+        With sync=True the increment is written immediately and False signals an exhausted quota.
+        """
+        if self._sync:
+            return self._write_increment(api_source, 1, success)
+
+        with self._pending_lock:
+            self._pending[api_source] += 1
+            self._pending_status[api_source] = success
+            pending_total = sum(self._pending.values())
+            if self._flush_thread is None:
+                self._flush_dynamodb = self._dynamodb.for_thread()
+                self._flush_thread = threading.Thread(target=self._flush_loop, name="quota-flush", daemon=True)
+                self._flush_thread.start()
+                atexit.register(self._flush_at_exit)
+
+        if pending_total >= FLUSH_THRESHOLD:
+            self._flush_wakeup.set()
+        return True
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._flush_wakeup.wait(FLUSH_INTERVAL_SECONDS)
+            self._flush_wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Background quota flush failed: %s", e)
+
+    def flush(self) -> None:
+        """
+        Write all pending increments, one UpdateItem (ADD :n) per API.
+        Increments that could not be written are merged back into the queue for the next flush.
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, defaultdict(int)
+                statuses, self._pending_status = self._pending_status, {}
+
+            unwritten = {}
+            for api_source, count in pending.items():
+                try:
+                    updated_item, cycle_date = self._apply_increment(api_source, count, statuses[api_source])
+                except Exception as e:
+                    # e.g. BotoCoreError (connection/read timeout): not a ClientError, so not handled below us
+                    logger.error("Failed to record %d request(s) for %s: %s", count, api_source, e)
+                    unwritten[api_source] = count
+                    continue
+
+                if not updated_item:
+                    logger.error("Failed to record %d request(s) for %s, will retry", count, api_source)
+                    unwritten[api_source] = count
+                    continue
+
+                # The count is stored from here on: a failing check must not re-queue it
+                try:
+                    self._check_quota(api_source, updated_item, cycle_date)
+                except Exception as e:
+                    logger.error("Quota check failed for %s: %s", api_source, e)
+
+            if unwritten:
+                with self._pending_lock:
+                    for api_source, count in unwritten.items():
+                        self._pending[api_source] += count
+                        # Keep the outcome of any newer request queued meanwhile
+                        self._pending_status.setdefault(api_source, statuses[api_source])
+
+    def _flush_at_exit(self) -> None:
+        """Final flush on interpreter shutdown; reports increments that still could not be written."""
+        self.flush()
+        with self._pending_lock:
+            dropped = sum(self._pending.values())
+            if dropped:
+                logger.error(
+                    "Dropped %d unwritten quota increment(s) at exit: %s",
+                    dropped, dict(self._pending)
+                )
+
+    def _write_increment(self, api_source: str, count: int, success: bool) -> bool:
+        """Write one increment and apply the quota checks. False signals a failed write or an exhausted quota."""
+        updated_item, cycle_date = self._apply_increment(api_source, count, success)
+        if not updated_item:
+            logger.error("Failed to record request for %s", api_source)
+            return False
+        return self._check_quota(api_source, updated_item, cycle_date)
+
+    def _apply_increment(self, api_source: str, count: int, success: bool) -> Tuple[Optional[Dict], str]:
         """
         Increment request count only if valid active cycle exists.
         If expired, create NEW cycle.
+        Returns (updated_item, cycle_date); updated_item is None when nothing was written.
         """
-        # 1. Find Active Cycle
-        active_item = self._get_active_cycle(api_source)
-        
-        cycle_date = None
-        if active_item:
-            cycle_date = active_item["tracking_date"]
-        else:
-            # Create NEW cycle
-            logger.info(f"Starting NEW monthly cycle for {api_source}")
-            cycle_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-            self._initialize_new_cycle(api_source, start_date=cycle_date)
-        
-        # 2. Increment in place
-        update_expr = "ADD request_count :inc SET last_request_at = :ts, updated_at = :ts, last_status = :st"
-        ts = datetime.now(timezone.utc).isoformat()
-        
-        updated_item = self.dynamodb.update_item(
-            key={"api_source": api_source, "tracking_date": cycle_date},
-            update_expression=update_expr,
-            expression_values={
-                ":inc": 1, 
-                ":ts": ts,
-                ":st": "success" if success else "failed"
-            }
-        )
+        # 1. Resolve the cycle key: known from earlier reads, else probe once
+        cycle_date = self._cycle_dates.get(api_source)
+        if cycle_date is None:
+            active_item = self._get_active_cycle(api_source)
+            cycle_date = active_item["tracking_date"] if active_item else None
+
+        if cycle_date is None:
+            cycle_date = self._start_new_cycle(api_source)
         
-        if not updated_item:
-            # Fallback: Maybe item expired ms ago? Safe retry logic could go here but minimal simple:
-            logger.error(f"Failed to record request for {api_source}")
-            return False
+        # 2. Increment in place, conditional on the cycle still being active (no read-before-write)
+        expression_values = {
+            ":inc": count, 
+            ":ts": get_utc_now().isoformat(),
+            ":st": "success" if success else "failed",
+            ":now": int(time.time())
+        }
+
+        def increment(date: str) -> Optional[dict]:
+            return self.dynamodb.update_item(
+                key={"api_source": api_source, "tracking_date": date},
+                update_expression=_RECORD_UPDATE_EXPR,
+                expression_values=expression_values,
+                expression_names=_RECORD_NAMES,
+                condition_expression=_RECORD_CONDITION_EXPR
+            )
+
+        try:
+            updated_item = increment(cycle_date)
+        except ClientError:
+            # ConditionalCheckFailed: cycle expired (or missing). Our cycle key may be stale (another
+            # process already rolled the cycle), so re-read the latest cycle before creating one.
+            logger.info("Cycle %s for %s is no longer active", cycle_date, api_source)
+            self._cycle_cache.pop(api_source, None)
+            active_item = self._get_active_cycle(api_source)
+            cycle_date = active_item["tracking_date"] if active_item else self._start_new_cycle(api_source)
+            try:
+                updated_item = increment(cycle_date)
+            except ClientError as e:
+                logger.error("Failed to record request for %s on new cycle %s: %s", api_source, cycle_date, e)
+                updated_item = None
 
-        # 3. Log Check and Auto-Throttle
+        # Counters changed: drop the cached cycle so the next read sees them
+        self._cycle_cache.pop(api_source, None)
+        return updated_item, cycle_date
+
+    def _check_quota(self, api_source: str, updated_item: Dict, cycle_date: str) -> bool:
+        """Log Check and Auto-Throttle after an increment. Returns False when the quota is exhausted."""
         request_count = updated_item.get("request_count", 0)
         limit = updated_item.get("quota_limit", 0)
-        usage_pct = (request_count / limit * 100) if limit > 0 else 0
 
         # Auto-throttle when quota exhausted
         if request_count >= limit:
-            logger.warning(f"{api_source} quota EXHAUSTED ({request_count}/{limit}) - Auto-throttling")
+            logger.warning("%s quota EXHAUSTED (%d/%d) - Auto-throttling", api_source, request_count, limit)
             self.mark_api_throttled(api_source, date=cycle_date)
             return False  # Signal quota exhausted
 
-        # Warn when approaching limit
-        if usage_pct >= 90 and limit < 1000000:
-             logger.warning(f"{api_source} monthly quota is {usage_pct:.1f}% used ({request_count}/{limit})")
+        # Warn when approaching limit (integer compare for >= 90%; percentage formatted lazily by logging)
+        if request_count * 10 >= 9 * limit and limit < 1000000:
+             logger.warning(
+                 "%s monthly quota is %.1f%% used (%d/%d)",
+                 api_source, request_count / limit * 100, request_count, limit
+             )
 
         return True
 
+    def _start_new_cycle(self, api_source: str) -> str:
+        """Create a NEW cycle starting today and return its tracking_date."""
+        logger.info("Starting NEW monthly cycle for %s", api_source)
+        cycle_date = get_utc_now().strftime("%Y-%m-%d")
+        self._initialize_new_cycle(api_source, start_date=cycle_date)
+        return cycle_date
+
     def mark_api_throttled(
         self, 
         api_source: str, 
@@ -137,46 +361,61 @@ class QuotaManager:
 
         Args:
             api_source: Name of the API
-            date: Date string YYYY-MM-DD; defaults to today
+            date: Cycle key (tracking_date) YYYY-MM-DD; defaults to the active cycle
 
         Returns:
             Name of failover API if defined, else None
         """
+        now = get_utc_now()
         if date is None:
-            date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-
-        update_expression = "SET #status = :throttled, throttled_at = :timestamp"
-        expression_values = {
-            ":throttled": "throttled",
-            ":timestamp": datetime.now(timezone.utc).isoformat()
-        }
-        expression_names = {"#status": "status"}
+            # Throttle the live cycle, so the flag lands on an item with ttl/request_count
+            active_item = self._get_active_cycle(api_source)
+            date = active_item["tracking_date"] if active_item else self._start_new_cycle(api_source)
 
         updated_item = self.dynamodb.update_item(
             key={"api_source": api_source, "tracking_date": date},
-            update_expression=update_expression,
-            expression_values=expression_values,
-            expression_names=expression_names
+            update_expression=_THROTTLE_UPDATE_EXPR,
+            expression_values={":throttled": "throttled", ":timestamp": now.isoformat()},
+            expression_names=_THROTTLE_NAMES
         )
+        self._cycle_cache.pop(api_source, None)
 
         if updated_item is None:
-            logger.error(f"Failed to mark {api_source} as throttled on {date}")
+            logger.error("Failed to mark %s as throttled on %s", api_source, date)
             return None
 
         failover_to = updated_item.get("failover_to")
         if failover_to:
-            logger.info(f"{api_source} marked as throttled, failing over to {failover_to}")
+            logger.info("%s marked as throttled, failing over to %s", api_source, failover_to)
         else:
-            logger.info(f"{api_source} marked as throttled, no failover configured")
+            logger.info("%s marked as throttled, no failover configured", api_source)
 
         return failover_to
     
     
     def get_usage_stats(self, api: Optional[str] = None, date: Optional[str] = None) -> List[Dict]:
         stats = []
-        apis = [api] if api else self.api_priority
+        apis = (api,) if api else self._api_names
+
+        # Fastest path: fresh in-memory cycles need no network call at all
+        batched = {}
+        for a in apis:
+            cached = self._get_cached_cycle(a)
+            if cached:
+                batched[a] = cached
+
+        # Fast path: one BatchGetItem for every other API whose current cycle key is already known
+        known = [a for a in apis if a not in batched and a in self._cycle_dates]
+        if known:
+            keys = [{"api_source": a, "tracking_date": self._cycle_dates[a]} for a in known]
+            for item in self.dynamodb.batch_get_item(keys) or []:
+                if self._is_active(item):
+                    batched[item["api_source"]] = item
+                    self._cache_cycle(item["api_source"], item)
+
         for a in apis:
-            item = self._get_active_cycle(a)
+            # Fallback: per-API Query (unknown cycle key, expired or missing from the batch)
+            item = batched.get(a) or self._get_active_cycle(a)
             if not item:
                 self._initialize_new_cycle(a)
                 item = self._get_active_cycle(a)
@@ -187,28 +426,40 @@ class QuotaManager:
 
     def _initialize_new_cycle(self, api: str, start_date: str = None):
         """Create a new 30-day quota cycle."""
+        now = get_utc_now()
+        now_iso = now.isoformat()
         if not start_date:
-            start_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+            start_date = now.strftime("%Y-%m-%d")
             
-        cfg = self.apis_config.get(api, {})
+        cfg = self._api_cfg.get(api) or _ApiCfg(100, None, 99)
         # TTL = 30 days from creation
-        ttl_seconds = 30 * 24 * 60 * 60
-        ttl_ts = int(datetime.now(timezone.utc).timestamp()) + ttl_seconds
+        ttl_ts = int(now.timestamp()) + CYCLE_TTL_SECONDS
         
         item = {
             "api_source": api,
             "tracking_date": start_date, # Start of Window
             "request_count": 0,
-            "quota_limit": cfg.get("quota_limit", 100),
+            "quota_limit": cfg.quota_limit,
             "quota_period": "monthly_rolling",
             "status": "active",
-            "failover_to": cfg.get("failover_to"),
-            "priority": cfg.get("priority", 99),
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "failover_to": cfg.failover_to,
+            "priority": cfg.priority,
+            "created_at": now_iso,
+            "updated_at": now_iso,
             "ttl": ttl_ts 
         }
-        self.dynamodb.put_item(item)
+        try:
+            # Never overwrite a live cycle (and its counter), e.g. one another process just created
+            if self.dynamodb.put_item(
+                item,
+                condition_expression=_NEW_CYCLE_CONDITION_EXPR,
+                expression_names=_RECORD_NAMES,
+                expression_values={":now": int(now.timestamp())}
+            ):
+                self._cycle_dates[api] = start_date
+        except ClientError:
+            logger.info("Cycle %s for %s already exists, keeping it", start_date, api)
+            self._cycle_dates[api] = start_date
 
     def _format_stats(self, item: Dict) -> Dict:
         request_count = item.get("request_count", 0)
@@ -217,8 +468,7 @@ class QuotaManager:
         
         # Calculate days remaining in cycle
         ttl = float(item.get("ttl", 0))
-        now = datetime.now(timezone.utc).timestamp()
-        days_left = max(0, round((ttl - now) / 86400, 1))
+        days_left = max(0, round((ttl - time.time()) / 86400, 1))
 
         return {
             "api_source": item.get("api_source"),
@@ -235,4 +485,7 @@ class QuotaManager:
     @staticmethod
     def print_usage_report(stats: List[Dict]):
         for s in stats:
-            logger.info(f"{s['api_source']}: {s['requests']}/{s['quota']} reqs, {s['ttl_days_left']} days left in cycle")
+            logger.info(
+                "%s: %s/%s reqs, %s days left in cycle",
+                s['api_source'], s['requests'], s['quota'], s['ttl_days_left']
+            )
@@ -1,51 +1,99 @@
 import os
+import re
 import logging
 import boto3
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
 
+# Shared keep-alive pool sized for concurrent existence checks
+S3_CLIENT_CONFIG = Config(max_pool_connections=32, retries={"max_attempts": 3, "mode": "adaptive"})
+
+_S3_SCHEME_RE = re.compile(r"^s3://")
+
+# Must stay <= S3_CLIENT_CONFIG.max_pool_connections
+PREFIX_CHECK_WORKERS = 16
+
 def get_s3_client():
-    """Create a Boto3 S3 client using environment variables."""
-    return boto3.client(
+    """Create a Boto3 S3 client using environment variables (memoized per settings)."""
+    return _make_client(
+        os.environ.get("AWS_ENDPOINT_URL"),
+        os.environ.get("AWS_ACCESS_KEY_ID"),
+        os.environ.get("AWS_SECRET_ACCESS_KEY"),
+        os.environ.get("AWS_REGION", "us-east-1")
+    )
+
+@lru_cache(maxsize=4)
+def _make_client(endpoint_url, access_key, secret_key, region):
+    return boto3.session.Session().client(
         "s3",
-        endpoint_url=os.environ.get("AWS_ENDPOINT_URL"),
-        aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
-        region_name=os.environ.get("AWS_REGION", "us-east-1")
+        endpoint_url=endpoint_url,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        region_name=region,
+        config=S3_CLIENT_CONFIG
     )
 
+@lru_cache(maxsize=1024)
+def _normalize_s3_uri(bucket, prefix):
+    """Return (bucket_name, key) from a bucket and a prefix/key given as full S3 URI or path."""
+    bucket_name = _S3_SCHEME_RE.sub("", bucket)
+    # Prefix may be s3://bucket/key/path..., bucket/key/path... or /key/path...
+    key = _S3_SCHEME_RE.sub("", prefix)
+    if key.startswith(bucket_name):
+        key = key[len(bucket_name):]
+    return bucket_name, key.lstrip("/")
+
 def check_s3_prefix_exists(client, bucket, prefix):
     """
     Check if any objects exist under the given prefix (efficiently).
-    Result is based on 'ListObjectsV2' with MaxKeys=1.
+    Result is based on 'ListObjectsV2' with MaxKeys=1 and Delimiter='/', so S3 stops at the
+    first key or common prefix instead of walking deep listings.
     """
     try:
-        # 1. Normalize Bucket Name (Strip s3://)
-        bucket_name = bucket.replace("s3://", "")
-        
-        # 2. Normalize Prefix
-        # The prefix might be full S3 URI: s3://bucket/key/path...
-        # Or just /key/path...
-        # We need just 'key/path...'
-        
-        prefix_clean = prefix
-        if prefix_clean.startswith("s3://"):
-             # Remove s3://
-             prefix_clean = prefix_clean[5:]
-             
-        # Start with bucket name? verification
-        if prefix_clean.startswith(bucket_name):
-             prefix_clean = prefix_clean[len(bucket_name):]
-             
-        # Remove leading slashes
-        prefix_clean = prefix_clean.lstrip("/")
+        bucket_name, prefix_clean = _normalize_s3_uri(bucket, prefix)
         
-        response = client.list_objects_v2(Bucket=bucket_name, Prefix=prefix_clean, MaxKeys=1)
-        return 'Contents' in response
+        response = client.list_objects_v2(Bucket=bucket_name, Prefix=prefix_clean, Delimiter="/", MaxKeys=1)
+        # KeyCount covers both objects (Contents) and rolled-up sub-prefixes (CommonPrefixes)
+        return response.get("KeyCount", 0) > 0
     except ClientError as e:
         logger.warning(f"S3 ClientError checking prefix {prefix} in {bucket}: {e}")
         return False
     except Exception as e:
         logger.warning(f"Unexpected error checking prefix {prefix} in {bucket}: {e}")
         return False
+
+def check_s3_key_exists(client, bucket, key):
+    """
+    Check if an exact object key exists with 'HeadObject' (cheaper than a listing).
+    Use check_s3_prefix_exists for directory-like prefixes.
+    """
+    try:
+        bucket_name, key_clean = _normalize_s3_uri(bucket, key)
+        client.head_object(Bucket=bucket_name, Key=key_clean)
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        logger.warning(f"S3 ClientError checking key {key} in {bucket}: {e}")
+        return False
+    except Exception as e:
+        logger.warning(f"Unexpected error checking key {key} in {bucket}: {e}")
+        return False
+
+def check_s3_prefixes_exist(client, bucket, prefixes: Iterable[str]) -> Dict[str, bool]:
+    """
+    Check several prefixes concurrently with check_s3_prefix_exists.
+    Returns {prefix: exists} in input order.
+    """
+    prefixes = list(dict.fromkeys(prefixes))
+    if not prefixes:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(PREFIX_CHECK_WORKERS, len(prefixes))) as ex:
+        results = ex.map(lambda p: check_s3_prefix_exists(client, bucket, p), prefixes)
+        return dict(zip(prefixes, results))
@@ -2,6 +2,8 @@
 from datetime import datetime, timezone
 from typing import Optional
 
+# Identity-checked on hot paths: values from get_utc_now() carry this exact tzinfo object
+_UTC = timezone.utc
 
 def get_utc_now() -> datetime:
     """
@@ -10,7 +12,7 @@ def get_utc_now() -> datetime:
     Returns:
         datetime: Current UTC time as timezone-aware datetime
     """
-    return datetime.now(timezone.utc)
+    return datetime.now(_UTC)
 
 
 def ensure_utc(dt: Optional[datetime]) -> Optional[datetime]:
@@ -29,12 +31,17 @@ def ensure_utc(dt: Optional[datetime]) -> Optional[datetime]:
     if dt is None:
         return None
 
-    if dt.tzinfo is None:
+    tz = dt.tzinfo
+    if tz is _UTC:
+        # Already UTC - nothing to convert
+        return dt
+
+    if tz is None:
         # Naive datetime - assume UTC and localize
-        return dt.replace(tzinfo=timezone.utc)
+        return dt.replace(tzinfo=_UTC)
 
-    # Already aware - convert to UTC if needed
-    return dt.astimezone(timezone.utc)
+    # Aware in another zone - convert to UTC
+    return dt.astimezone(_UTC)
 
 
 def to_iso_utc(dt: datetime) -> str:
@@ -47,5 +54,7 @@ def to_iso_utc(dt: datetime) -> str:
     Returns:
         str: ISO 8601 formatted string with UTC timezone (e.g., '2024-01-01T12:00:00+00:00')
     """
+    if dt is not None and dt.tzinfo is _UTC:
+        return dt.isoformat()
     utc_dt = ensure_utc(dt)
     return utc_dt.isoformat() if utc_dt else None